@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import time
+import zipfile
+
+import trial7
+from telemetry import record_tokens
+
+# Bulk pipeline runs over a directory (or zip) of decks, without going through
+# /create_user/ and /create_new_session/ one deck at a time.
+# Every PDF at the top level is one deck; every sub-directory is one company whose PDFs
+# (deck, financials, ...) are attached together to a single vector store with file_batches.
+# Results are written to results.jsonl (or .parquet) with a progress.json next to them.
+
+batch_dir = os.getenv("BATCH_DIR", "batches")
+# Cap on the total uncompressed size of a zip of decks, so a zip bomb cannot fill the disk
+max_extract_bytes = int(os.getenv("MAX_BATCH_EXTRACT_BYTES", str(4 * 1024 * 1024 * 1024)))
+
+
+def check_batch_options(subheadings, parallel, output_format):
+    trial7.report_templates.resolve(subheadings)
+    if parallel < 1:
+        raise ValueError("parallel must be at least 1")
+    if output_format not in ("jsonl", "parquet"):
+        raise ValueError(f"Unknown output format {output_format}")
+    if output_format == "parquet" and not (importlib.util.find_spec("pandas") and
+                                           (importlib.util.find_spec("pyarrow") or importlib.util.find_spec("fastparquet"))):
+        raise ValueError("Parquet output needs pandas and pyarrow (or fastparquet) installed")
+
+
+def check_archive(path):
+    if not zipfile.is_zipfile(path):
+        raise ValueError("Upload is not a zip file")
+    with zipfile.ZipFile(path) as archive:
+        size = sum(info.file_size for info in archive.infolist())
+    if size > max_extract_bytes:
+        raise ValueError(f"Zip expands to {size} bytes, more than {max_extract_bytes}")
+
+
+def extract_archive(path, source_dir):
+    check_archive(path)
+    with zipfile.ZipFile(path) as archive:
+        archive.extractall(source_dir)
+    # A zip of a single folder holds the decks one level down
+    entries = os.listdir(source_dir)
+    if len(entries) == 1 and os.path.isdir(os.path.join(source_dir, entries[0])):
+        return os.path.join(source_dir, entries[0])
+    return source_dir
+
+
+def find_decks(source_dir):
+    decks = []
+    for name in sorted(os.listdir(source_dir)):
+        path = os.path.join(source_dir, name)
+        if os.path.isdir(path):
+            files = [os.path.join(root, file) for root, _, names in os.walk(path) for file in sorted(names)
+                     if file.lower().endswith(".pdf")]
+            if files:
+                decks.append((name, files))
+        elif name.lower().endswith(".pdf"):
+            decks.append((os.path.splitext(name)[0], [path]))
+    return decks
+
+
+def store_deck_file(path):
+    # Same content-addressed layout as uploads through /create_new_session/
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(trial7.upload_chunk_size):
+            digest.update(chunk)
+    deck_hash = digest.hexdigest()
+    os.makedirs(trial7.upload_dir, exist_ok=True)
+    blob_path = os.path.join(trial7.upload_dir, f"{deck_hash}.pdf")
+    if not os.path.exists(blob_path):
+        shutil.copyfile(path, blob_path + ".part")
+        os.replace(blob_path + ".part", blob_path)
+    return deck_hash, blob_path
+
+
+async def analyse_deck(name, paths, subheadings, parallel_sections, keep_vector_stores):
+    started = time.perf_counter()
+    usage = []
+    token = trial7.run_usage.set(usage)
+    row = {"name": name, "files": [os.path.basename(path) for path in paths]}
+    vector_store_id = thread_id = None
+    try:
+        stored = [await asyncio.to_thread(store_deck_file, path) for path in paths]
+        file_ids = [(await trial7.upload_stage({"deck_hash": deck_hash, "file_path": blob_path}))["file_id"]
+                    for deck_hash, blob_path in stored]
+        hashes = sorted(deck_hash for deck_hash, _ in stored)
+        deck_hash = hashes[0] if len(hashes) == 1 else hashlib.sha256("".join(hashes).encode()).hexdigest()
+        row["deck_hash"] = deck_hash
+
+        async with trial7.openai_limit:
+            vector_store = await trial7.client.beta.vector_stores.create(name=name)
+            vector_store_id = vector_store.id
+            file_batch = await trial7.client.beta.vector_stores.file_batches.create_and_poll(vector_store_id=vector_store_id,
+                                                                                             file_ids=file_ids)
+        # Files that failed indexing are invisible to file_search, so the deck is failed rather than summarized without them
+        counts = file_batch.file_counts
+        if file_batch.status != "completed" or counts.failed or counts.cancelled:
+            raise RuntimeError(f"Indexing ended with status {file_batch.status}: {counts.failed} failed and "
+                               f"{counts.cancelled} cancelled of {counts.total} files")
+        thread_id = await trial7.create_report_thread(vector_store_id)
+
+        summary_task = trial7.generate_summary(vector_store_id, thread_id, deck_hash, await trial7.batch_summary_assistant())
+        if subheadings:
+            row["summary"], row["report"] = await asyncio.gather(
+                summary_task, trial7.build_report(subheadings, vector_store_id, deck_hash, parallel_sections))
+        else:
+            row["summary"] = await summary_task
+        row["error"] = None
+    except Exception as e:
+        print(f"Batch deck {name} failed: {e!r}")
+        row["error"] = str(e)
+    finally:
+        trial7.run_usage.reset(token)
+        if thread_id:
+            await trial7.delete_thread(thread_id)
+        if vector_store_id and not keep_vector_stores:
+            await trial7.delete_vector_store(vector_store_id)
+
+    record_tokens("batch_analysis", usage)
+    row["tokens"] = sum(run.total_tokens for run in usage)
+    row["seconds"] = round(time.perf_counter() - started, 2)
+    return row
+
+
+def write_progress(path, progress, started):
+    elapsed = time.perf_counter() - started
+    minutes = max(elapsed / 60, 1e-9)
+    progress.update(
+        elapsed_seconds=round(elapsed, 1),
+        decks_per_minute=round((progress["completed"] + progress["failed"]) / minutes, 2),
+        tokens_per_minute=round(progress["total_tokens"] / minutes),
+    )
+    with open(path + ".part", "w") as f:
+        json.dump(progress, f, indent=2)
+    os.replace(path + ".part", path)
+
+
+async def run_batch(source, output_dir, subheadings=(), parallel=4, parallel_sections=False, output_format="jsonl",
+                    keep_vector_stores=False):
+    os.makedirs(output_dir, exist_ok=True)
+    results_path = os.path.join(output_dir, "results.jsonl")
+    progress_path = os.path.join(output_dir, "progress.json")
+    progress = {"status": "running", "total": 0, "completed": 0, "failed": 0, "total_tokens": 0, "results": results_path}
+    started = time.perf_counter()
+    write_progress(progress_path, progress, started)
+
+    try:
+        check_batch_options(subheadings, parallel, output_format)
+        selected = trial7.report_templates.resolve(subheadings)
+        if os.path.isdir(source):
+            source_dir = source
+        else:
+            source_dir = await asyncio.to_thread(extract_archive, source, os.path.join(output_dir, "input"))
+
+        decks = find_decks(source_dir)
+        progress["total"] = len(decks)
+        write_progress(progress_path, progress, started)
+
+        limit = asyncio.Semaphore(parallel)
+        rows = []
+
+        async def run_one(name, paths):
+            async with limit:
+                row = await analyse_deck(name, paths, selected, parallel_sections, keep_vector_stores)
+            rows.append(row)
+            with open(results_path, "a") as f:
+                f.write(json.dumps(row) + "\n")
+            progress["failed" if row["error"] else "completed"] += 1
+            progress["total_tokens"] += row["tokens"]
+            write_progress(progress_path, progress, started)
+            print(f"[{progress['completed'] + progress['failed']}/{progress['total']}] {name}: "
+                  f"{'failed' if row['error'] else 'done'} in {row['seconds']}s, {row['tokens']} tokens")
+
+        open(results_path, "w").close()
+        await asyncio.gather(*(run_one(name, paths) for name, paths in decks))
+
+        if output_format == "parquet":
+            import pandas as pd
+            progress["results"] = os.path.join(output_dir, "results.parquet")
+            await asyncio.to_thread(pd.DataFrame(rows).to_parquet, progress["results"])
+    except Exception as e:
+        progress.update(status="failed", error=str(e))
+        write_progress(progress_path, progress, started)
+        raise
+
+    progress["status"] = "completed"
+    write_progress(progress_path, progress, started)
+    return progress
+
+
+async def main(args):
+    await trial7.start_clients()
+    try:
+        progress = await run_batch(args.source, args.output, args.subheadings, args.parallel, args.parallel_sections,
+                                   args.format, args.keep_vector_stores)
+    finally:
+        await trial7.close_clients()
+    print(json.dumps(progress, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse a directory or zip of pitch decks in bulk")
+    parser.add_argument("source", help="directory of decks or a zip file")
+    parser.add_argument("--output", default=os.path.join(batch_dir, time.strftime("%Y%m%d-%H%M%S")))
+    parser.add_argument("--subheadings", nargs="*", default=[], help="report sections to generate for every deck")
+    parser.add_argument("--parallel", type=int, default=4, help="decks analysed at once")
+    parser.add_argument("--parallel-sections", action="store_true", help="generate report sections concurrently")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--keep-vector-stores", action="store_true")
+    asyncio.run(main(parser.parse_args()))
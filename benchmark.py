@@ -0,0 +1,611 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+from openai import AsyncOpenAI
+
+from fake_upstream import start_fake_upstream
+
+# Benchmarks for trial7.py against local stub servers.
+# The Assistants API is replaced by fake_upstream.py (retrieval can use the real
+# embeddings API with --embeddings openai); Mongo is an in-memory mongomock by
+# default, or whatever MONGODB_URI points at with --mongo uri (startup always uses
+# MONGODB_URI, as it times a fresh process). To get "before" numbers, run the same command from a checkout of an
+# older commit and compare the printed JSON, or let suite compare against a saved baseline.
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_stats(latencies, elapsed):
+    if not latencies:
+        return {"requests": 0, "requests_per_second": 0}
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+    }
+
+
+def use_in_memory_mongo():
+    # Every Motor or pymongo client the app builds becomes a mongomock one, so no mongod is needed.
+    # Patched before the app is imported, so clients built at import time (older checkouts used
+    # a module-level pymongo client) are covered as well
+    try:
+        import mongomock
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("--mongo memory needs mongomock-motor (pip install mongomock-motor)")
+    import motor.motor_asyncio
+    import pymongo
+
+    motor.motor_asyncio.AsyncIOMotorClient = lambda uri=None, **options: AsyncMongoMockClient(tz_aware=True)
+    pymongo.MongoClient = lambda uri=None, **options: mongomock.MongoClient(tz_aware=True)
+
+
+def start_app(app_path, port, in_memory_mongo=False, ingest_workers=0):
+    module_name, attr = app_path.split(":")
+    if in_memory_mongo:
+        use_in_memory_mongo()
+    module = importlib.import_module(module_name)
+    if in_memory_mongo and hasattr(module, "AsyncIOMotorClient"):
+        # In case the app was imported before the patch
+        import motor.motor_asyncio
+        module.AsyncIOMotorClient = motor.motor_asyncio.AsyncIOMotorClient
+    app = getattr(module, attr)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+
+    async def serve():
+        # Ingest workers share the app's event loop, which an in-memory Mongo requires
+        if ingest_workers:
+            import worker
+
+            async def work():
+                await module.mongo_ready.wait()
+                await worker.ensure_job_indexes()
+                await asyncio.gather(*(worker.work_loop() for _ in range(ingest_workers)))
+
+            workers = asyncio.create_task(work())
+        await server.serve()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def create_benchmark_user(http):
+    response = await http.post("/create_user/", data={"name": "Bench", "company_name": "Bench Co", "mobile_no": "0"})
+    response.raise_for_status()
+    return response.json()["user_id"]
+
+
+async def run_load(base_url, endpoint, concurrency, total, users):
+    # Requests are spread over several users: turns of one user share a thread and run one at a time
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as http:
+        user_ids = [await create_benchmark_user(http) for _ in range(users)]
+        latencies = []
+        queue = asyncio.Queue()
+        for i in range(total):
+            queue.put_nowait(i)
+
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                user_id = user_ids[i % users]
+                started = time.perf_counter()
+                if endpoint == "chat":
+                    response = await http.post("/chat/", data={"user_id": user_id, "user_input": f"Question {i}"})
+                else:
+                    response = await http.post("/generate_report/", data={"user_id": user_id, "subheadings": ["Market Analysis", "Risk Assessment"]})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latency_stats(latencies, time.perf_counter() - started)
+
+
+async def run_chat_turns(base_url, turns):
+    # One long-lived conversation; with thread rollover the per-turn latency should stay flat
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as http:
+        user_id = await create_benchmark_user(http)
+        latencies = []
+        for turn in range(turns):
+            question = f"Turn {turn}: how do the unit economics and burn rate described in the deck compare with peers? " * 4
+            started = time.perf_counter()
+            response = await http.post("/chat/", data={"user_id": user_id, "user_input": question})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    window = max(1, min(20, turns // 4))
+    first = statistics.mean(latencies[:window])
+    last = statistics.mean(latencies[-window:])
+    return {
+        "turns": turns,
+        "first_turns_mean_ms": round(first * 1000),
+        "last_turns_mean_ms": round(last * 1000),
+        "last_to_first_ratio": round(last / first, 2),
+        "max_ms": round(max(latencies) * 1000),
+        "per_turn_ms": [round(latency * 1000) for latency in latencies],
+    }
+
+
+def detection_lag_stats(lags):
+    # How long after the fake upstream finished each polled run the app's poller first saw it done
+    if not lags:
+        return {"polled_runs": 0}
+    return {
+        "polled_runs": len(lags),
+        "detection_lag_p50_ms": round(percentile(lags, 50) * 1000, 1),
+        "detection_lag_p95_ms": round(percentile(lags, 95) * 1000, 1),
+        "detection_lag_max_ms": round(max(lags) * 1000, 1),
+    }
+
+
+def check_detection_lag(result, max_lag_ms):
+    lag = result.get("detection_lag_p95_ms")
+    if lag is not None and lag > max_lag_ms:
+        print(f"Run completion detected too late: p95 {lag} ms > {max_lag_ms} ms")
+        sys.exit(1)
+
+
+def peak_rss_mb():
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_fake_deck(path, size_mb):
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+        f.write(b"\n%%EOF\n")
+
+
+async def run_upload_memory(base_url, uploads, size_mb):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(uploads):
+            path = os.path.join(tmp, f"deck_{i}.pdf")
+            write_fake_deck(path, size_mb)
+            paths.append(path)
+
+        async with httpx.AsyncClient(base_url=base_url, timeout=600) as http:
+            user_id = await create_benchmark_user(http)
+            rss_before = peak_rss_mb()
+
+            async def upload(path):
+                with open(path, "rb") as deck:
+                    response = await http.post("/create_new_session/", data={"user_id": user_id, "company_name": "Bench Co"},
+                                               files={"file": (os.path.basename(path), deck, "application/pdf")})
+                response.raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(upload(path) for path in paths))
+            elapsed = time.perf_counter() - started
+
+    return {
+        "uploads": uploads,
+        "upload_size_mb": size_mb,
+        "seconds": round(elapsed, 2),
+        "peak_rss_before_mb": round(rss_before, 1),
+        "peak_rss_after_mb": round(peak_rss_mb(), 1),
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+async def run_retrieval(decks_dir, k, queries_per_deck):
+    import local_index
+
+    client = AsyncOpenAI()
+    rng = random.Random(0)
+    build_seconds = []
+    search_latencies = []
+    end_to_end_latencies = []
+    hits = 0
+    queries = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in sorted(os.listdir(decks_dir)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            index_dir = os.path.join(tmp, name)
+            started = time.perf_counter()
+            await local_index.build_deck_index(client, os.path.join(decks_dir, name), index_dir)
+            build_seconds.append(time.perf_counter() - started)
+            if not local_index.index_exists(index_dir):
+                continue
+
+            index = local_index.load_index(index_dir)
+            for _ in range(queries_per_deck):
+                # Query with a short window of words from a random chunk; a hit means that chunk comes back in the top k
+                target = rng.randrange(len(index.chunks))
+                words = index.chunks[target]["text"].split()
+                start = rng.randrange(max(1, len(words) - 12))
+                query = " ".join(words[start:start + 12])
+
+                started = time.perf_counter()
+                query_vector = (await local_index.embed_texts(client, [query]))[0]
+                search_started = time.perf_counter()
+                results = index.search(query_vector, k)
+                search_latencies.append(time.perf_counter() - search_started)
+                end_to_end_latencies.append(time.perf_counter() - started)
+
+                queries += 1
+                hits += any(result["text"] == index.chunks[target]["text"] for result in results)
+
+    return {
+        "decks": len(build_seconds),
+        "queries": queries,
+        f"recall_at_{k}": round(hits / queries, 3) if queries else None,
+        "index_build_mean_s": round(statistics.mean(build_seconds), 2) if build_seconds else None,
+        "search_p50_ms": round(percentile(search_latencies, 50) * 1000, 3) if queries else None,
+        "search_p99_ms": round(percentile(search_latencies, 99) * 1000, 3) if queries else None,
+        "with_query_embedding_p99_ms": round(percentile(end_to_end_latencies, 99) * 1000, 1) if queries else None,
+    }
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, weight = part.split("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - set(suite_operations)
+    if unknown:
+        sys.exit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def fake_deck_bytes(rng, size_kb):
+    return b"%PDF-1.4\n" + rng.randbytes(size_kb * 1024) + b"\n%%EOF\n"
+
+
+async def suite_create_user(http, rng, users, options):
+    response = await http.post("/create_user/", data={"name": "Load", "company_name": "Load Co", "mobile_no": "0"})
+    response.raise_for_status()
+    users.append(response.json()["user_id"])
+    return response
+
+
+async def suite_create_session(http, rng, users, options):
+    deck = fake_deck_bytes(rng, options["deck_kb"])
+    return await http.post("/create_new_session/", data={"user_id": rng.choice(users), "company_name": "Load Co"},
+                           files={"file": ("deck.pdf", deck, "application/pdf")})
+
+
+async def suite_chat(http, rng, users, options):
+    data = {"user_id": rng.choice(users), "user_input": f"What is the burn rate and runway? ({rng.randrange(1000)})"}
+    if rng.random() < options["stream_fraction"]:
+        data["stream"] = "true"
+    return await http.post("/chat/", data=data)
+
+
+async def suite_report(http, rng, users, options):
+    data = {"user_id": rng.choice(users), "subheadings": rng.sample(suite_subheadings, rng.randint(1, 3))}
+    mode = rng.random()
+    if mode < options["stream_fraction"]:
+        data["stream"] = "true"
+    elif mode < options["stream_fraction"] + options["parallel_fraction"]:
+        data["parallel"] = "true"
+    return await http.post("/generate_report/", data=data)
+
+
+def response_ok(response):
+    # A streamed failure still answers 200; it is reported by an error event or a stream that ends without done
+    if response.status_code >= 400:
+        return False
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        events = re.findall(r"^event: (\S+)", response.text, re.MULTILINE)
+        return "error" not in events and "done" in events
+    return True
+
+
+suite_operations = {"user": suite_create_user, "session": suite_create_session, "chat": suite_chat, "report": suite_report}
+suite_subheadings = ["market-analysis", "risk-assessment", "go-to-market-strategy", "founders-background", "performance-metrics"]
+
+
+async def run_suite(base_url, weights, concurrency, total, users_count, options, seed):
+    rng = random.Random(seed)
+    latencies = {name: [] for name in weights}
+    errors = {name: 0 for name in weights}
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as http:
+        # Every virtual user starts with an account and an uploaded deck, like returning users do
+        users = []
+        for _ in range(users_count):
+            await suite_create_user(http, rng, users, options)
+        for user_id in list(users):
+            response = await http.post("/create_new_session/", data={"user_id": user_id, "company_name": "Load Co"},
+                                       files={"file": ("deck.pdf", fake_deck_bytes(rng, options["deck_kb"]), "application/pdf")})
+            response.raise_for_status()
+
+        names = list(weights)
+        plan = rng.choices(names, weights=[weights[name] for name in names], k=total)
+        queue = asyncio.Queue()
+        for name in plan:
+            queue.put_nowait(name)
+        rss_before = peak_rss_mb()
+
+        async def worker():
+            while not queue.empty():
+                name = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await suite_operations[name](http, rng, users, options)
+                    ok = response_ok(response)
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies[name].append(time.perf_counter() - started)
+                else:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    operations = {name: {**latency_stats(latencies[name], elapsed), "errors": errors[name]} for name in names}
+    overall = latency_stats([latency for name in names for latency in latencies[name]], elapsed)
+    overall["errors"] = sum(errors.values())
+    overall["error_rate"] = round(overall["errors"] / total, 4)
+    return {
+        "operations": operations,
+        "overall": overall,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+min_comparable_samples = 100
+
+
+def compare_with_baseline(result, baseline, tolerance):
+    # Lower throughput, higher latency, more errors or more memory than the baseline allows is a regression.
+    # Throughput and latency are only compared where both runs have enough samples for them to be stable.
+    regressions = []
+
+    def check(label, current, reference, higher_is_worse, allowed=tolerance):
+        if current is None or not reference:
+            return
+        change = (current - reference) / reference
+        if (change > allowed) if higher_is_worse else (change < -allowed):
+            regressions.append(f"{label}: {reference} -> {current} ({change:+.0%})")
+
+    for name, reference in baseline["operations"].items():
+        current = result["operations"].get(name)
+        if current is None or min(current["requests"], reference["requests"]) < min_comparable_samples:
+            continue
+        check(f"{name} requests_per_second", current.get("requests_per_second"), reference.get("requests_per_second"), False)
+        check(f"{name} p50_ms", current.get("p50_ms"), reference.get("p50_ms"), True)
+        check(f"{name} p95_ms", current.get("p95_ms"), reference.get("p95_ms"), True)
+    overall, reference = result["overall"], baseline["overall"]
+    if min(overall["requests"], reference["requests"]) >= min_comparable_samples:
+        check("overall requests_per_second", overall.get("requests_per_second"), reference.get("requests_per_second"), False)
+        check("overall p95_ms", overall.get("p95_ms"), reference.get("p95_ms"), True)
+        check("overall p99_ms", overall.get("p99_ms"), reference.get("p99_ms"), True, 2 * tolerance)
+    check("peak_rss_mb", result["peak_rss_mb"], baseline["peak_rss_mb"], True)
+    if overall["error_rate"] > reference["error_rate"] + 0.01:
+        regressions.append(f"error_rate: {reference['error_rate']} -> {overall['error_rate']}")
+    return regressions
+
+
+def run_startup(app_path, port, runs):
+    # Cold start of a fresh uvicorn process: time until /healthz answers and until /readyz reports ready
+    live_times = []
+    ready_times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"])
+        live = ready = None
+        try:
+            while ready is None and time.perf_counter() - started < 60:
+                try:
+                    if live is None and httpx.get(f"http://127.0.0.1:{port}/healthz").status_code == 200:
+                        live = time.perf_counter() - started
+                    if live is not None and httpx.get(f"http://127.0.0.1:{port}/readyz").status_code == 200:
+                        ready = time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+        finally:
+            process.terminate()
+            process.wait()
+        live_times.append(live)
+        ready_times.append(ready)
+
+    live_times = [t for t in live_times if t is not None]
+    ready_times = [t for t in ready_times if t is not None]
+    return {
+        "runs": runs,
+        "live_mean_ms": round(statistics.mean(live_times) * 1000) if live_times else None,
+        "live_max_ms": round(max(live_times) * 1000) if live_times else None,
+        "ready_mean_ms": round(statistics.mean(ready_times) * 1000) if ready_times else None,
+        "ready_max_ms": round(max(ready_times) * 1000) if ready_times else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the pitch deck analysis API")
+    parser.add_argument("--app", default="trial7:app")
+    parser.add_argument("--port", type=int, default=8765)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    # Options shared by every benchmark that serves the app in this process
+    app_options = argparse.ArgumentParser(add_help=False)
+    app_options.add_argument("--mongo", choices=["memory", "uri"], default="memory",
+                             help="mongomock in memory or MONGODB_URI")
+    app_options.add_argument("--max-detection-lag-ms", type=float, default=1000,
+                             help="fail when the p95 delay between a run finishing and a poll seeing it exceeds this")
+
+    load = subparsers.add_parser("load", help="requests/second and p99 latency under concurrent load", parents=[app_options])
+    load.add_argument("--endpoint", choices=["chat", "report"], default="chat")
+    load.add_argument("--concurrency", type=int, default=32)
+    load.add_argument("--requests", type=int, default=256)
+    load.add_argument("--users", type=int, default=16, help="users the requests are spread over")
+
+    upload_memory = subparsers.add_parser("upload-memory", help="peak RSS while N large decks upload concurrently",
+                                          parents=[app_options])
+    upload_memory.add_argument("--uploads", type=int, default=8)
+    upload_memory.add_argument("--size-mb", type=int, default=100)
+
+    retrieval = subparsers.add_parser("retrieval", help="local index build time, search latency and recall@k over sample decks")
+    retrieval.add_argument("--decks", required=True, help="directory of sample PDF decks")
+    retrieval.add_argument("--k", type=int, default=6)
+    retrieval.add_argument("--queries-per-deck", type=int, default=20)
+    retrieval.add_argument("--embeddings", choices=["fake", "openai"], default="fake",
+                           help="fake upstream vectors (checks the index plumbing only) or the real embeddings API")
+
+    chat_turns = subparsers.add_parser("chat-turns", help="per-turn latency over one long conversation", parents=[app_options])
+    chat_turns.add_argument("--turns", type=int, default=200)
+
+    startup = subparsers.add_parser("startup", help="cold-start time of a fresh app process to liveness and readiness")
+    startup.add_argument("--runs", type=int, default=5)
+
+    suite = subparsers.add_parser("suite", help="offline load test over a mix of endpoints, compared against a baseline",
+                                  parents=[app_options])
+    suite.add_argument("--mix", default="user=5,session=10,chat=65,report=20", help="operation weights")
+    suite.add_argument("--concurrency", type=int, default=32)
+    suite.add_argument("--requests", type=int, default=600)
+    suite.add_argument("--users", type=int, default=20, help="users created (each with a deck) before the timed run")
+    suite.add_argument("--stream-fraction", type=float, default=0.3, help="share of chat and report requests that stream")
+    suite.add_argument("--parallel-fraction", type=float, default=0.2, help="share of report requests in parallel mode")
+    suite.add_argument("--deck-kb", type=int, default=256)
+    suite.add_argument("--run-latency", type=float, default=0.5, help="seconds each fake run takes")
+    suite.add_argument("--rate-limit-rpm", type=float, default=0, help="fake upstream request limit per minute (0 = none)")
+    suite.add_argument("--ingest-workers", type=int, default=4,
+                       help="ingest job loops; a separate worker.py process with --mongo uri, inside the app process with memory")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--baseline", default="benchmark_baseline.json", help="results to compare against")
+    suite.add_argument("--save-baseline", action="store_true", help="write this run's results as the new baseline")
+    suite.add_argument("--tolerance", type=float, default=0.25, help="allowed relative change before a metric regresses")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "retrieval" and args.embeddings == "openai":
+        # Real embeddings: OPENAI_API_KEY (and OPENAI_BASE_URL, if set) are taken from the environment as-is
+        upstream = None
+    else:
+        if args.benchmark == "suite":
+            upstream, upstream_url = start_fake_upstream(run_latency=args.run_latency, rate_limit_rpm=args.rate_limit_rpm)
+        else:
+            upstream, upstream_url = start_fake_upstream()
+        os.environ["OPENAI_BASE_URL"] = upstream_url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    os.environ.setdefault("ASSISTANT_ID", "asst_bench")
+    os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+    if args.benchmark == "chat-turns":
+        # Small enough that a 200-turn conversation rolls over several times against the fake upstream
+        os.environ.setdefault("THREAD_TOKEN_LIMIT", "4000")
+    if args.benchmark == "upload-memory":
+        os.environ.setdefault("MAX_UPLOAD_BYTES", str((args.size_mb + 1) * 1024 * 1024))
+
+    if args.benchmark == "startup":
+        try:
+            result = run_startup(args.app, args.port, args.runs)
+            print(json.dumps({"benchmark": args.benchmark, "app": args.app, **result}))
+        finally:
+            upstream.shutdown()
+        return
+
+    if args.benchmark == "retrieval":
+        try:
+            result = asyncio.run(run_retrieval(args.decks, args.k, args.queries_per_deck))
+            # Fake vectors are not semantic, so recall then only shows chunks, vectors and search line up
+            print(json.dumps({"benchmark": args.benchmark, "embeddings": args.embeddings,
+                              "recall_meaning": "retrieval quality" if args.embeddings == "openai" else "plumbing check only",
+                              **result}))
+        finally:
+            if upstream:
+                upstream.shutdown()
+        return
+
+    if args.benchmark == "suite":
+        baseline_path = os.path.abspath(args.baseline)
+        # Uploads, the result cache and the .env written by /create_user/ stay out of the checkout
+        workdir = tempfile.mkdtemp(prefix="suite-")
+        os.chdir(workdir)
+        os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(workdir, "result_cache.sqlite3"))
+        if args.mongo == "memory":
+            # An in-memory Mongo cannot be shared with another process, so the job loops run in the app's
+            # event loop and share its user_lock: turns never meet a summary run from another process
+            ingest = {"workers": args.ingest_workers, "mode": "in-process",
+                      "note": "cross-process thread contention is not exercised; use --mongo uri for that"}
+            server, base_url = start_app(args.app, args.port, True, args.ingest_workers)
+            worker_process = None
+        else:
+            ingest = {"workers": args.ingest_workers, "mode": "process"}
+            server, base_url = start_app(args.app, args.port, False)
+            worker_process = None
+            if args.ingest_workers:
+                worker_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+                worker_process = subprocess.Popen([sys.executable, worker_path, "--workers", "1",
+                                                   "--concurrency", str(args.ingest_workers)])
+        try:
+            options = {"stream_fraction": args.stream_fraction, "parallel_fraction": args.parallel_fraction, "deck_kb": args.deck_kb}
+            result = asyncio.run(run_suite(base_url, parse_mix(args.mix), args.concurrency, args.requests, args.users,
+                                           options, args.seed))
+        finally:
+            server.should_exit = True
+            if worker_process:
+                worker_process.terminate()
+                worker_process.wait()
+            upstream.shutdown()
+        result = {"benchmark": args.benchmark, "app": args.app, "mix": args.mix, "concurrency": args.concurrency,
+                  "run_latency": args.run_latency, "rate_limit_rpm": args.rate_limit_rpm, "ingest": ingest, **result,
+                  "upstream": dict(upstream.stats), **detection_lag_stats(upstream.detection_lags)}
+        print(json.dumps(result, indent=2))
+        check_detection_lag(result, args.max_detection_lag_ms)
+
+        if args.save_baseline:
+            with open(baseline_path, "w") as f:
+                json.dump(result, f, indent=2)
+                f.write("\n")
+            print(f"Saved baseline to {baseline_path}")
+        elif os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            for setting in ("mix", "concurrency", "run_latency", "rate_limit_rpm"):
+                if baseline.get(setting) != result[setting]:
+                    print(f"Warning: baseline was recorded with {setting}={baseline.get(setting)}, this run used {result[setting]}")
+            regressions = compare_with_baseline(result, baseline, args.tolerance)
+            if regressions:
+                print("Regressions against baseline:\n  " + "\n  ".join(regressions))
+                sys.exit(1)
+            print(f"No regressions against {baseline_path}")
+        return
+
+    server, base_url = start_app(args.app, args.port, args.mongo == "memory")
+    try:
+        if args.benchmark == "load":
+            result = asyncio.run(run_load(base_url, args.endpoint, args.concurrency, args.requests, args.users))
+        elif args.benchmark == "chat-turns":
+            result = asyncio.run(run_chat_turns(base_url, args.turns))
+        elif args.benchmark == "upload-memory":
+            result = asyncio.run(run_upload_memory(base_url, args.uploads, args.size_mb))
+        result = {"benchmark": args.benchmark, "app": args.app, **result, **detection_lag_stats(upstream.detection_lags)}
+        print(json.dumps(result))
+    finally:
+        server.should_exit = True
+        upstream.shutdown()
+    check_detection_lag(result, args.max_detection_lag_ms)
+
+
+if __name__ == "__main__":
+    main()
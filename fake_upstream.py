@@ -0,0 +1,318 @@
+import base64
+import hashlib
+import json
+import os
+import struct
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for the parts of the Assistants API that trial7.py uses.
+# Runs complete RUN_LATENCY seconds (plus LATENCY_PER_1K_TOKENS for every thousand tokens
+# already in the thread) after they are created, so the app sees the same long-running,
+# context-dependent upstream calls it would see against the real service. Streamed runs
+# send their reply as SSE deltas spread over the same duration. With a rate limit set,
+# requests over it get 429s with the same retry headers the real API sends.
+
+RUN_LATENCY = float(os.getenv("FAKE_RUN_LATENCY", "2.0"))
+LATENCY_PER_1K_TOKENS = float(os.getenv("FAKE_LATENCY_PER_1K_TOKENS", "0.05"))
+POLL_AFTER_MS = int(os.getenv("FAKE_POLL_AFTER_MS", "100"))
+REQUEST_LATENCY = float(os.getenv("FAKE_REQUEST_LATENCY", "0"))
+RATE_LIMIT_RPM = float(os.getenv("FAKE_RATE_LIMIT_RPM", "0"))
+FIRST_TOKEN_FRACTION = float(os.getenv("FAKE_FIRST_TOKEN_FRACTION", "0.25"))
+REPLY_TEXT = "<b>Company Summary</b> Stub analysis of the uploaded pitch deck."
+EMBEDDING_DIMENSIONS = 256
+
+runs = {}
+threads = {}
+runs_lock = threading.Lock()
+counter = 0
+
+
+def fake_embedding(text):
+    # Hashed bag of words: texts sharing words get similar vectors, which is enough for recall checks
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % EMBEDDING_DIMENSIONS] += 1.0
+    return vector
+
+
+def count_tokens(messages):
+    # Roughly four characters per token
+    return sum(len(str(message.get("content", ""))) // 4 for message in messages or [])
+
+
+def new_id(prefix):
+    global counter
+    with runs_lock:
+        counter += 1
+        return f"{prefix}_{counter}"
+
+
+def active_run(thread_id):
+    # Like the real API, a thread takes no new message or run until its current run has ended.
+    # Callers hold runs_lock so the check and whatever they add to the thread happen together.
+    for run_id, run in runs.items():
+        if run["thread_id"] == thread_id and time.monotonic() < run["done_at"]:
+            return run_id
+    return None
+
+
+def complete_run(run_id, thread_id, detection_lags=None):
+    # Returns the run's usage once it is done, adding the reply to the thread's token count the first time.
+    # detection_lags collects how long after finishing each polled run was first seen as done
+    completion_tokens = len(REPLY_TEXT) // 4
+    with runs_lock:
+        run = runs.get(run_id, {"done_at": 0, "prompt_tokens": 0, "counted": True})
+        now = time.monotonic()
+        if now < run["done_at"]:
+            return None
+        if not run["counted"]:
+            run["counted"] = True
+            threads[thread_id] = threads.get(thread_id, 0) + completion_tokens
+            if detection_lags is not None:
+                detection_lags.append(now - run["done_at"])
+    return {"prompt_tokens": run["prompt_tokens"], "completion_tokens": completion_tokens,
+            "total_tokens": run["prompt_tokens"] + completion_tokens}
+
+
+class RateLimiter:
+    # Requests-per-minute token bucket, like the per-key limit upstream
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, per_minute / 60)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, int(self.tokens), 0.0
+            return False, 0, (1 - self.tokens) / self.rate
+
+
+class FakeAssistantsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status=200, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("openai-poll-after-ms", str(POLL_AFTER_MS))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def throttled(self):
+        server = self.server
+        server.stats["requests"] += 1
+        if server.request_latency:
+            time.sleep(server.request_latency)
+        if server.rate_limiter is None:
+            return False
+        allowed, remaining, reset = server.rate_limiter.take()
+        if allowed:
+            return False
+        server.stats["rate_limited"] += 1
+        self.read_body()
+        self.send_json({"error": {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}},
+                       status=429, headers={"retry-after": f"{reset:.3f}", "x-ratelimit-remaining-requests": str(remaining),
+                                            "x-ratelimit-reset-requests": f"{reset:.3f}s"})
+        return True
+
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+    def stream_run(self, run_id, thread_id, assistant_id):
+        self.server.stats["streamed_runs"] += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        run = {"id": run_id, "object": "thread.run", "thread_id": thread_id, "assistant_id": assistant_id, "status": "queued"}
+        message = {"id": new_id("msg"), "object": "thread.message", "thread_id": thread_id, "run_id": run_id,
+                   "assistant_id": assistant_id, "role": "assistant", "content": [], "status": "in_progress"}
+        self.send_event("thread.run.created", run)
+        self.send_event("thread.run.in_progress", {**run, "status": "in_progress"})
+        self.send_event("thread.message.created", message)
+
+        # The first delta arrives after FIRST_TOKEN_FRACTION of the run, the rest are spread over what is left
+        duration = max(0.0, runs[run_id]["done_at"] - time.monotonic())
+        words = REPLY_TEXT.split(" ")
+        time.sleep(duration * FIRST_TOKEN_FRACTION)
+        for i, word in enumerate(words):
+            text = {"value": word if i == 0 else " " + word, "annotations": []}
+            self.send_event("thread.message.delta", {"id": message["id"], "object": "thread.message.delta",
+                                                     "delta": {"content": [{"index": 0, "type": "text", "text": text}]}})
+            time.sleep(duration * (1 - FIRST_TOKEN_FRACTION) / len(words))
+
+        with runs_lock:
+            runs[run_id]["done_at"] = time.monotonic()
+        usage = complete_run(run_id, thread_id)
+        self.send_event("thread.message.completed", {**message, "status": "completed",
+                                                     "content": [{"type": "text", "text": {"value": REPLY_TEXT, "annotations": []}}]})
+        self.send_event("thread.run.completed", {**run, "status": "completed", "usage": usage})
+        self.wfile.write(b"event: done\ndata: [DONE]\n\n")
+        self.wfile.flush()
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def do_POST(self):
+        if self.throttled():
+            return
+        body = self.read_body()
+        path = urlparse(self.path).path
+        if path.endswith("/embeddings"):
+            request = json.loads(body)
+            texts = [request["input"]] if isinstance(request["input"], str) else request["input"]
+            data = []
+            for i, text in enumerate(texts):
+                vector = fake_embedding(text)
+                if request.get("encoding_format") == "base64":
+                    vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode()
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            return self.send_json({"object": "list", "data": data, "model": request.get("model"),
+                                   "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+        if path.endswith("/vector_stores"):
+            return self.send_json({"id": new_id("vs"), "object": "vector_store", "status": "completed"})
+        if path.endswith("/threads"):
+            thread_id = new_id("thread")
+            with runs_lock:
+                threads[thread_id] = count_tokens(json.loads(body or b"{}").get("messages"))
+            return self.send_json({"id": thread_id, "object": "thread"})
+        if re.search(r"/vector_stores/[^/]+/files$", path):
+            return self.send_json({"id": new_id("file"), "object": "vector_store.file", "status": "completed"})
+        if path.endswith("/files"):
+            return self.send_json({"id": new_id("file"), "object": "file", "status": "processed"})
+        if re.search(r"/threads/[^/]+$", path):
+            return self.send_json({"id": path.rsplit("/", 1)[-1], "object": "thread", "tool_resources": json.loads(body).get("tool_resources")})
+        if path.endswith("/assistants") or re.search(r"/assistants/[^/]+$", path):
+            return self.send_json({"id": new_id("asst"), "object": "assistant", "model": "gpt-4o", "instructions": "",
+                                   "tools": [{"type": "file_search"}]})
+        if re.search(r"/vector_stores/[^/]+/file_batches$", path):
+            return self.send_json({"id": new_id("vsfb"), "object": "vector_store.file_batch", "status": "completed",
+                                   "file_counts": {"completed": 1, "failed": 0, "in_progress": 0, "cancelled": 0, "total": 1}})
+        match = re.search(r"/threads/([^/]+)/messages$", path)
+        if match:
+            with runs_lock:
+                busy = active_run(match.group(1))
+                if not busy:
+                    threads[match.group(1)] = threads.get(match.group(1), 0) + count_tokens([json.loads(body)])
+            if busy:
+                return self.send_json({"error": {"message": f"Can't add messages to {match.group(1)} while a run {busy} is active.",
+                                                 "type": "invalid_request_error"}}, status=400)
+            return self.send_json({"id": new_id("msg"), "object": "thread.message", "thread_id": match.group(1)})
+        match = re.search(r"/threads/([^/]+)/runs$", path)
+        if match:
+            thread_id = match.group(1)
+            run_id = new_id("run")
+            request = json.loads(body)
+            with runs_lock:
+                busy = active_run(thread_id)
+                if not busy:
+                    prompt_tokens = threads.get(thread_id, 0) + count_tokens(request.get("additional_messages"))
+                    threads[thread_id] = prompt_tokens
+                    duration = self.server.run_latency + prompt_tokens / 1000 * LATENCY_PER_1K_TOKENS
+                    runs[run_id] = {"done_at": time.monotonic() + duration, "created_at": time.time(), "duration": duration,
+                                    "thread_id": thread_id, "prompt_tokens": prompt_tokens, "counted": False}
+            if busy:
+                return self.send_json({"error": {"message": f"Thread {thread_id} already has an active run {busy}.",
+                                                 "type": "invalid_request_error"}}, status=400)
+            if request.get("stream"):
+                return self.stream_run(run_id, thread_id, request.get("assistant_id"))
+            return self.send_json({"id": run_id, "object": "thread.run", "thread_id": match.group(1), "status": "queued",
+                                   "created_at": int(runs[run_id]["created_at"])})
+        self.send_json({"error": {"message": f"Unknown path {path}"}}, status=404)
+
+    def do_DELETE(self):
+        if self.throttled():
+            return
+        object_id = urlparse(self.path).path.rstrip("/").rsplit("/", 1)[-1]
+        with runs_lock:
+            threads.pop(object_id, None)
+        self.send_json({"id": object_id, "object": "deleted", "deleted": True})
+
+    def do_GET(self):
+        if self.throttled():
+            return
+        url = urlparse(self.path)
+        match = re.search(r"/threads/([^/]+)/runs/([^/]+)$", url.path)
+        if match:
+            usage = complete_run(match.group(2), match.group(1), self.server.detection_lags)
+            run = runs.get(match.group(2), {})
+            body = {"id": match.group(2), "object": "thread.run", "thread_id": match.group(1),
+                    "status": "in_progress" if usage is None else "completed"}
+            if "created_at" in run:
+                # Whole seconds, like the real API
+                body["created_at"] = int(run["created_at"])
+            if usage is not None:
+                body["usage"] = usage
+                if "created_at" in run:
+                    body["completed_at"] = int(run["created_at"] + run["duration"])
+            return self.send_json(body)
+        match = re.search(r"/threads/([^/]+)/messages$", url.path)
+        if match:
+            query = parse_qs(url.query)
+            if "after" in query:
+                # Only the reply of a given run is modelled, so there is never anything newer to page through
+                return self.send_json({"object": "list", "data": [], "has_more": False})
+            run_id = query.get("run_id", [None])[0]
+            message = {
+                "id": new_id("msg"),
+                "object": "thread.message",
+                "thread_id": match.group(1),
+                "run_id": run_id,
+                "role": "assistant",
+                "content": [{"type": "text", "text": {"value": REPLY_TEXT, "annotations": []}}],
+            }
+            return self.send_json({"object": "list", "data": [message], "has_more": False})
+        match = re.search(r"/assistants/([^/]+)$", url.path)
+        if match:
+            return self.send_json({"id": match.group(1), "object": "assistant", "name": "Pitch Deck Analysis Bot", "model": "gpt-4o",
+                                   "instructions": "Fake instructions", "tools": [{"type": "file_search"}]})
+        match = re.search(r"/vector_stores/([^/]+)/files/([^/]+)$", url.path)
+        if match:
+            return self.send_json({"id": match.group(2), "object": "vector_store.file", "status": "completed",
+                                   "vector_store_id": match.group(1)})
+        match = re.search(r"/vector_stores/([^/]+)/file_batches/([^/]+)$", url.path)
+        if match:
+            return self.send_json({"id": match.group(2), "object": "vector_store.file_batch", "status": "completed",
+                                   "file_counts": {"completed": 1, "failed": 0, "in_progress": 0, "cancelled": 0, "total": 1}})
+        self.send_json({"error": {"message": f"Unknown path {url.path}"}}, status=404)
+
+
+def start_fake_upstream(host="127.0.0.1", port=0, run_latency=RUN_LATENCY, rate_limit_rpm=RATE_LIMIT_RPM,
+                        request_latency=REQUEST_LATENCY):
+    server = ThreadingHTTPServer((host, port), FakeAssistantsHandler)
+    server.daemon_threads = True
+    server.run_latency = run_latency
+    server.rate_limiter = RateLimiter(rate_limit_rpm) if rate_limit_rpm else None
+    server.request_latency = request_latency
+    server.stats = Counter()
+    server.detection_lags = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    server, base_url = start_fake_upstream(port=int(os.getenv("FAKE_UPSTREAM_PORT", "8089")))
+    print(f"Fake Assistants API listening on {base_url}")
+    threading.Event().wait()
@@ -0,0 +1,127 @@
+import asyncio
+import contextlib
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+from pypdf import PdfReader
+
+# Local retrieval over pitch decks: page text extraction (with OCR for image-only slides),
+# word-window chunking, batched embeddings and a flat cosine index kept in a memory-mapped
+# float32 file next to the chunk text. One index directory per deck SHA-256, so an index is
+# never rebuilt for a deck that has already been seen.
+
+embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "96"))
+chunk_words = int(os.getenv("CHUNK_WORDS", "180"))
+chunk_overlap = int(os.getenv("CHUNK_OVERLAP_WORDS", "40"))
+
+
+def ocr_page(pdf_path, page_number):
+    try:
+        import pytesseract
+        from pdf2image import convert_from_path
+    except ImportError:
+        print(f"Skipping OCR for page {page_number} of {pdf_path}: pytesseract/pdf2image not installed")
+        return ""
+    images = convert_from_path(pdf_path, first_page=page_number, last_page=page_number)
+    return "\n".join(pytesseract.image_to_string(image) for image in images)
+
+
+def extract_pages(pdf_path):
+    pages = []
+    for page_number, page in enumerate(PdfReader(pdf_path).pages, start=1):
+        text = (page.extract_text() or "").strip()
+        if not text:
+            text = ocr_page(pdf_path, page_number).strip()
+        pages.append(text)
+    return pages
+
+
+def chunk_pages(pages):
+    chunks = []
+    step = max(1, chunk_words - chunk_overlap)
+    for page_number, text in enumerate(pages, start=1):
+        words = text.split()
+        for start in range(0, len(words), step):
+            chunks.append({"page": page_number, "text": " ".join(words[start:start + chunk_words])})
+            if start + chunk_words >= len(words):
+                break
+    return chunks
+
+
+async def embed_texts(client, texts, limit=None):
+    async def embed_batch(batch):
+        async with limit or contextlib.nullcontext():
+            response = await client.embeddings.create(model=embedding_model, input=batch)
+        return [item.embedding for item in response.data]
+
+    batches = [texts[i:i + embedding_batch_size] for i in range(0, len(texts), embedding_batch_size)]
+    results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    vectors = np.array([vector for batch in results for vector in batch], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def write_index(index_dir, chunks, vectors):
+    os.makedirs(index_dir, exist_ok=True)
+    vectors_path = os.path.join(index_dir, "vectors.f32")
+    mapped = np.memmap(vectors_path + ".part", dtype=np.float32, mode="w+", shape=vectors.shape)
+    mapped[:] = vectors
+    mapped.flush()
+    del mapped
+    os.replace(vectors_path + ".part", vectors_path)
+    # chunks.json is what marks an index as complete, so it is moved into place last
+    chunks_path = os.path.join(index_dir, "chunks.json")
+    with open(chunks_path + ".part", "w") as f:
+        json.dump({"dimensions": vectors.shape[1], "chunks": chunks}, f)
+    os.replace(chunks_path + ".part", chunks_path)
+
+
+class DeckIndex:
+    def __init__(self, index_dir):
+        with open(os.path.join(index_dir, "chunks.json")) as f:
+            meta = json.load(f)
+        self.chunks = meta["chunks"]
+        self.vectors = np.memmap(os.path.join(index_dir, "vectors.f32"), dtype=np.float32, mode="r",
+                                 shape=(len(self.chunks), meta["dimensions"]))
+
+    def search(self, query_vector, k):
+        scores = self.vectors @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.chunks[i], "score": float(scores[i])} for i in top]
+
+
+@lru_cache(maxsize=256)
+def load_index(index_dir):
+    return DeckIndex(index_dir)
+
+
+def index_exists(index_dir):
+    return os.path.exists(os.path.join(index_dir, "chunks.json"))
+
+
+async def build_deck_index(client, pdf_path, index_dir, limit=None):
+    if index_exists(index_dir):
+        return
+    pages = await asyncio.to_thread(extract_pages, pdf_path)
+    chunks = chunk_pages(pages)
+    if not chunks:
+        print(f"No text found in {pdf_path}; local index not built")
+        return
+    vectors = await embed_texts(client, [chunk["text"] for chunk in chunks], limit)
+    await asyncio.to_thread(write_index, index_dir, chunks, vectors)
+
+
+async def search_deck(client, index_dir, query, k, limit=None):
+    if not index_exists(index_dir):
+        return []
+    query_vector = (await embed_texts(client, [query], limit))[0]
+    return load_index(index_dir).search(query_vector, k)
+
+
+def format_chunks(chunks):
+    return "\n\n".join(f"[Page {chunk['page']}] {chunk['text']}" for chunk in chunks)
@@ -0,0 +1,163 @@
+import hashlib
+
+# Report templates, built once at import: the shared instructions preamble plus one template
+# per report section. Every template has a stable content hash; the hash of a selection is
+# what keys pooled report assistants and cached report results. Bump TEMPLATE_VERSION when
+# changing how templates are put together so older cached results are not reused.
+
+TEMPLATE_VERSION = "1"
+
+instructions = """You'll be given a Pitch Deck of a company that contains all the information about the company. Your main job is to understand all the instructions and give a structured response
+The main function you possess is when the user asks to generate a report You must generate a report about the company in a specific format. The format must be
+
+Default Format(Let this be the default format for any report generation)
+    
+    <b>Company Summary</b>
+    Give a long summary of the company. It should be in a paragraph format of about eight lines.
+        
+    <b>Founder Overview</b>
+    Check how many founders or co-founders are there.
+    For each person mention their name in a separate bullet point along with their designation and below that mention their background, what they have done in the past and how many years of expertise they have as a paragraph.
+
+    <b>Fundamentals of underlying technology</b>
+    Identify the technologies used in the product or service provided by the company. Mention them as sequential points with numerical numbering.
+    1.[Technology 1]
+    [Explanation of the technology in terms of a long paragraph]
+    2.[Technology 2]
+    [Explanation of the technology in terms of a long paragraph]
+    .
+    .
+    .etc.
+    Take each technology and explain it extensively.
+    Under each technology or feature give an explanation of what it is and how it is used in the product or service. Give a very detailed explanation as to how the technology works and how it is integrated.
+    I need big paragraphs of at least 10 lines explaining each technology. Even if the content is small make sure the explanation is done in detail.
+
+    <b>Product and use case overview</b>
+    Explain how the product is used in real world and how the end user can use the product. Explain how the end user can benefit from this product and also explain any limitations it may contain according to your analysis. Explain everything the product does.
+    The explanation should be very detailed and in the form of a paragraph of at least 10 sentences.
+
+    <b>Go to market</b>
+    Explain the target customers and the market the product or service is aimed for. Explain in detail how the company is getting these customers.
+    The explanation should be in detail, in a paragraph format of at least 10 sentences.
+
+    <b>Market Analysis</b>
+        • Market size: [Insert numerical data]
+        • Growth trends: [Describe qualitatively]
+        • Competition analysis: [Describe qualitatively]
+        • Opportunities: [Describe qualitatively]
+        • Market share: [Insert numerical data]
+        • Growth projections: [Insert numerical data]
+
+    <b>Founders' Background</b>
+        • Qualifications: [Describe qualitatively]
+        • Experience: [Describe qualitatively]
+        • Past successes: [Insert numerical data]
+        • Industry recognition: [Describe qualitatively]"""
+
+section_templates = [
+    ("go-to-market-strategy", "Go-to-Market Strategy", """
+        <b>Go-to-Market Strategy</b>
+            • Target audience: [Describe qualitatively]
+            • Marketing strategies: [Describe qualitatively]
+            • Partnerships: [Describe qualitatively]
+            • Customer acquisition costs: [Insert numerical data]
+            • Conversion rates: [Insert numerical data]
+        """),
+    ("market-analysis", "Market Analysis", """
+        <b>Market Analysis</b>
+            • Market size: [Insert numerical data]
+            • Growth trends: [Describe qualitatively]
+            • Competition analysis: [Describe qualitatively]
+            • Opportunities: [Describe qualitatively]
+            • Market share: [Insert numerical data]
+            • Growth projections: [Insert numerical data]
+        """),
+    ("founders-background", "Founders' Background", """
+        <b>Founders' Background</b>
+            • Qualifications: [Describe qualitatively]
+            • Experience: [Describe qualitatively]
+            • Past successes: [Insert numerical data]
+            • Industry recognition: [Describe qualitatively]
+        """),
+    ("customer-feedback", "Customer Feedback", """
+        <b>Customer Feedback</b>:
+            • Satisfaction metrics: [Insert numerical data]
+            • Retention rates: [Insert numerical data]
+        """),
+    ("risk-assessment", "Risk Assessment", """
+        <b>Risk Assessment</b>
+            • Risk factors:
+            • List specific risk factors and explain their potential impact.
+            • Include numerical data on risk mitigation strategies and their effectiveness.
+            • Regulatory Issues: [Describe qualitatively]
+        """),
+    ("performance-metrics", "Performance Metrics", """
+        <b>Performance Metrics</b>
+            • Key metrics:
+            • Revenue growth: [Insert numerical data]
+            • Profitability: [Insert numerical data]
+            • Customer acquisition cost: [Insert numerical data]
+            • Market share: [Insert numerical data]
+            • Benchmarking:
+            • Performance gaps: [Insert numerical data]
+            • Improvement targets: [Insert numerical data]
+        """),
+    ("strategic-analysis", "Strategic Analysis", """
+        <b>Strategic Analysis</b>
+            • SWOT Analysis:
+            • Strengths: [Describe qualitatively]
+            • Weaknesses: [Describe qualitatively]
+            • Opportunities: [Describe qualitatively]
+            • Threats: [Describe qualitatively]
+            • Market positioning: [Insert numerical data]
+            • Competitive advantages: [Insert numerical data]
+        """),
+]
+
+
+class ReportSection:
+    def __init__(self, section_id, title, text):
+        self.id = section_id
+        self.title = title
+        self.text = text
+        self.hash = hashlib.sha256(text.encode()).hexdigest()
+
+
+class UnknownSubheadingError(ValueError):
+    def __init__(self, unknown):
+        super().__init__(f"Unknown report subheadings: {', '.join(unknown)}")
+        self.unknown = unknown
+
+
+class TemplateRegistry:
+    def __init__(self, preamble, templates):
+        self.preamble = preamble
+        self.preamble_hash = hashlib.sha256((TEMPLATE_VERSION + preamble).encode()).hexdigest()
+        self.sections = [ReportSection(*template) for template in templates]
+        self.lookup = {}
+        for section in self.sections:
+            self.lookup[section.id] = section
+            self.lookup[section.title] = section
+        self.compiled = {}
+
+    def resolve(self, names):
+        # Accepts section IDs or titles; unknown names are rejected before anything is sent upstream
+        unknown = [name for name in names if name not in self.lookup]
+        if unknown:
+            raise UnknownSubheadingError(unknown)
+        selected = {self.lookup[name].id for name in names}
+        return tuple(section for section in self.sections if section.id in selected)
+
+    def key(self, sections):
+        return hashlib.sha256(":".join([self.preamble_hash] + [section.hash for section in sections]).encode()).hexdigest()
+
+    def instructions(self, sections):
+        # The preamble always comes first and sections follow in registry order, so every report
+        # assistant's instructions share the same long prefix and upstream prompt caching can hit
+        key = self.key(sections)
+        if key not in self.compiled:
+            self.compiled[key] = self.preamble + "".join(section.text for section in sections)
+        return self.compiled[key]
+
+
+report_templates = TemplateRegistry(instructions, section_templates)
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import random
+import re
+import time
+
+from openai import APIConnectionError, APIStatusError, RateLimitError
+
+# One polling loop for every in-flight Assistants run in the process, in place of a
+# create_and_poll loop per request. The first poll of a run is scheduled for when recent
+# runs (by their own created_at/completed_at) would have finished; past that point it is
+# polled at a short, bounded interval, so a finished run is noticed soon after it ends.
+# Failed polls back off with jitter, and all poll requests draw from a shared token
+# bucket that backs off when upstream reports rate limits.
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete", "requires_action"}
+
+
+class RunFailedError(Exception):
+    pass
+
+
+def parse_reset_seconds(value):
+    # Rate-limit reset headers look like "1s", "250ms" or "6m0s"
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value or ""):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class PendingRun:
+    def __init__(self, thread_id, future, started, expected_end, delay):
+        self.thread_id = thread_id
+        self.future = future
+        self.started = started
+        self.expected_end = expected_end
+        self.delay = delay
+        self.next_poll_at = max(expected_end, started + delay)
+        self.polls = 0
+        self.errors = 0
+
+
+class RunPoller:
+    def __init__(self, client, bucket, min_delay=0.5, max_delay=10.0, backoff=1.6, max_errors=5, overshoot_fraction=0.1):
+        # The SDK's own retries would sleep inside a poll and bypass the bucket; a failed poll is
+        # simply rescheduled on the run's backoff instead
+        self.client = client.with_options(max_retries=0)
+        self.bucket = bucket
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_errors = max_errors
+        # Past its expected end a run is polled every min_delay, or every overshoot_fraction of its
+        # age for long runs, so noticing completion late costs at most that much
+        self.overshoot_fraction = overshoot_fraction
+        self.pending = {}
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.polls_in_flight = set()
+        self.typical_duration = None
+        self.poll_requests = 0
+        self.completed_runs = 0
+
+    async def wait(self, thread_id, run_id):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.poll_forever())
+
+        started = time.monotonic()
+        # Most runs take about as long as the recent ones did, so nothing is polled before then
+        expected_end = started + (self.typical_duration or 0)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[run_id] = PendingRun(thread_id, future, started, expected_end, self.min_delay)
+        self.wakeup.set()
+        try:
+            run = await future
+        finally:
+            self.pending.pop(run_id, None)
+
+        # The run's own timestamps, not the time spent waiting here, which includes the polling delay
+        if run.status == "completed" and run.created_at and run.completed_at:
+            duration = run.completed_at - run.created_at
+            self.typical_duration = duration if self.typical_duration is None else 0.8 * self.typical_duration + 0.2 * duration
+        return run
+
+    async def poll_forever(self):
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            due = [(run_id, pending) for run_id, pending in self.pending.items() if pending.next_poll_at <= now]
+            if not due:
+                next_poll_at = min(pending.next_poll_at for pending in self.pending.values())
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), None if next_poll_at == float("inf") else next_poll_at - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for run_id, pending in due:
+                # Parked until the poll finishes and reschedules it
+                pending.next_poll_at = float("inf")
+                task = asyncio.create_task(self.poll(run_id, pending))
+                self.polls_in_flight.add(task)
+                task.add_done_callback(self.polls_in_flight.discard)
+
+    async def poll(self, run_id, pending):
+        await self.bucket.acquire()
+        self.poll_requests += 1
+        pending.polls += 1
+        try:
+            response = await self.client.beta.threads.runs.with_raw_response.retrieve(run_id, thread_id=pending.thread_id)
+            # Parsed here so a malformed body fails the waiter instead of killing this task and leaving it hanging
+            run = response.parse()
+        except RateLimitError as e:
+            self.bucket.pause(float(e.response.headers.get("retry-after", 1)))
+            self.back_off(pending)
+            return
+        except (APIConnectionError, APIStatusError) as e:
+            pending.errors += 1
+            if pending.errors >= self.max_errors and not pending.future.done():
+                pending.future.set_exception(e)
+            else:
+                self.back_off(pending)
+            return
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+            return
+
+        if response.headers.get("x-ratelimit-remaining-requests") == "0":
+            self.bucket.pause(parse_reset_seconds(response.headers.get("x-ratelimit-reset-requests")))
+
+        pending.errors = 0
+        pending.delay = self.min_delay
+        if run.status in TERMINAL_STATUSES:
+            self.completed_runs += 1
+            if not pending.future.done():
+                pending.future.set_result(run)
+            return
+
+        poll_after = response.headers.get("openai-poll-after-ms")
+        self.reschedule(pending, float(poll_after) / 1000 if poll_after else 0)
+
+    def reschedule(self, pending, at_least=0):
+        now = time.monotonic()
+        if now < pending.expected_end:
+            pending.next_poll_at = pending.expected_end
+        else:
+            interval = min(max(self.min_delay, self.overshoot_fraction * (now - pending.started)), self.max_delay)
+            pending.next_poll_at = now + max(interval, at_least)
+        self.wakeup.set()
+
+    def back_off(self, pending):
+        # Only failed polls back off exponentially
+        pending.delay = min(pending.delay * self.backoff, self.max_delay)
+        pending.next_poll_at = time.monotonic() + pending.delay * random.uniform(0.8, 1.2)
+        self.wakeup.set()
+
+    def metrics(self):
+        return {
+            "in_flight_runs": len(self.pending),
+            "poll_requests": self.poll_requests,
+            "completed_runs": self.completed_runs,
+            "polls_per_completed_run": round(self.poll_requests / self.completed_runs, 2) if self.completed_runs else None,
+        }
+
+
+def create_run_poller(client):
+    rate = float(os.getenv("POLL_REQUESTS_PER_SECOND", "20"))
+    return RunPoller(client, TokenBucket(rate, capacity=max(1.0, rate)))
@@ -0,0 +1,155 @@
+import bisect
+import contextlib
+import re
+import time
+
+from pymongo import monitoring
+
+# In-process instrumentation for the request pipeline: OpenTelemetry-style spans around
+# upstream and Mongo calls that feed latency histograms, token counters, and a Prometheus
+# text rendering of all of it for /metrics. When opentelemetry is installed every span is
+# also exported as a real trace span; without it only the metrics are kept.
+
+try:
+    from opentelemetry import trace
+    tracer = trace.get_tracer("pitchdeck")
+except ImportError:
+    tracer = None
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=latency_buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(list(self.series.items())):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, label_values)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, label_values)} {count}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, amount, *label_values):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(list(self.series.items())):
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+
+stage_latency = Histogram("pitchdeck_stage_duration_seconds", "Duration of instrumented pipeline stages", ("stage",))
+stage_errors = CounterMetric("pitchdeck_stage_errors_total", "Pipeline stages that raised", ("stage",))
+request_latency = Histogram("pitchdeck_request_duration_seconds", "HTTP request duration by route", ("method", "route", "status"))
+upstream_latency = Histogram("pitchdeck_upstream_request_duration_seconds", "OpenAI API request duration",
+                             ("method", "route", "status"))
+mongo_latency = Histogram("pitchdeck_mongo_command_duration_seconds", "MongoDB command duration", ("command", "status"))
+token_usage = CounterMetric("pitchdeck_tokens_total", "Tokens reported in run.usage", ("endpoint", "kind"))
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    started = time.perf_counter()
+    with tracer.start_as_current_span(name, attributes={k: v for k, v in attributes.items() if v is not None}) \
+            if tracer else contextlib.nullcontext():
+        try:
+            yield
+        except BaseException:
+            stage_errors.inc(1, name)
+            raise
+        finally:
+            stage_latency.observe(time.perf_counter() - started, name)
+
+
+def record_tokens(endpoint, usage):
+    for run in usage:
+        token_usage.inc(run.prompt_tokens, endpoint, "prompt")
+        token_usage.inc(run.completion_tokens, endpoint, "completion")
+
+
+# Upstream IDs (thread_..., run_..., asst_..., vs_..., file-...) are collapsed so routes stay low-cardinality
+upstream_id = re.compile(r"/(?:thread|run|asst|vs|vsfb|msg|step|file)[_-][A-Za-z0-9]+")
+
+
+async def upstream_request_started(request):
+    request.extensions["started"] = time.perf_counter()
+
+
+async def upstream_request_finished(response):
+    request = response.request
+    route = upstream_id.sub("/{id}", request.url.path)
+    upstream_latency.observe(time.perf_counter() - request.extensions["started"], request.method, route, response.status_code)
+
+
+def upstream_event_hooks():
+    # httpx hooks on the shared OpenAI client, so every upstream request (including run polls) is timed
+    return {"request": [upstream_request_started], "response": [upstream_request_finished]}
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    # Registered on the Motor client, so every Mongo operation is timed without wrapping each call
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, event.command_name, "ok")
+
+    def failed(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, event.command_name, "error")
+
+
+def render_metrics(gauges=()):
+    lines = []
+    for metric in (request_latency, stage_latency, stage_errors, upstream_latency, mongo_latency, token_usage):
+        lines.extend(metric.render())
+    for name, help, value in gauges:
+        if value is None:
+            continue
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {format_value(value)}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymongo import ReturnDocument
+
+import trial7
+from telemetry import render_metrics, span
+from trial7 import ingest_stage_handlers, ingest_stages, job_lease_seconds, job_max_attempts
+
+# Worker pool for the ingestion jobs queued by /create_new_session/.
+# Each process claims jobs from the Mongo jobs collection with a lease, runs the current
+# stage and hands the job on to the next one, so a deck is always uploaded, then indexed,
+# then summarized, and jobs whose worker died are picked up again once the lease expires.
+
+idle_poll_seconds = float(os.getenv("JOB_IDLE_POLL_SECONDS", "0.5"))
+# When set, worker process i serves its own Prometheus /metrics on metrics_port + i
+metrics_port = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+
+async def ensure_job_indexes():
+    await trial7.jobs.create_index([("status", 1), ("created_at", 1)])
+    await trial7.jobs.create_index("locked_until")
+
+
+async def claim_job():
+    now = datetime.now(timezone.utc)
+    # A job whose worker died on its last attempt is failed rather than handed out again
+    await trial7.jobs.update_many(
+        {"status": "running", "locked_until": {"$lt": now}, "attempts": {"$gte": job_max_attempts}},
+        {"$set": {"status": "failed", "error": f"Lease expired on attempt {job_max_attempts}", "updated_at": now}},
+    )
+    # locked_by identifies this claim, so a worker whose lease expired cannot overwrite the job's next owner
+    return await trial7.jobs.find_one_and_update(
+        {"$or": [{"status": "queued"},
+                 {"status": "running", "locked_until": {"$lt": now}, "attempts": {"$lt": job_max_attempts}}]},
+        {"$set": {"status": "running", "locked_by": os.urandom(8).hex(),
+                  "locked_until": now + timedelta(seconds=job_lease_seconds), "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def run_job(job):
+    stage = job["stage"]
+    try:
+        with span(f"ingest.{stage}", job_id=job["_id"], attempt=job["attempts"]):
+            result = await ingest_stage_handlers[stage](job)
+    except Exception as e:
+        print(f"Job {job['_id']} failed in stage {stage} (attempt {job['attempts']}): {e!r}")
+        status = "failed" if job["attempts"] >= job_max_attempts else "queued"
+        await finish_job(job, {"status": status, "error": str(e)})
+        return
+
+    next_index = ingest_stages.index(stage) + 1
+    if next_index < len(ingest_stages):
+        update = {"stage": ingest_stages[next_index], "status": "queued", "attempts": 0}
+    else:
+        update = {"status": "completed"}
+    await finish_job(job, {**result, **update, "error": None})
+
+
+async def finish_job(job, update):
+    result = await trial7.jobs.update_one({"_id": job["_id"], "status": "running", "locked_by": job["locked_by"]},
+                                          {"$set": {**update, "updated_at": datetime.now(timezone.utc)}})
+    if not result.matched_count:
+        print(f"Job {job['_id']} was reclaimed after its lease expired; dropping the result of stage {job['stage']}")
+
+
+async def work_loop():
+    while True:
+        job = await claim_job()
+        if job is None:
+            await asyncio.sleep(idle_poll_seconds)
+            continue
+        await run_job(job)
+
+
+async def work(concurrency):
+    await trial7.start_clients()
+    await ensure_job_indexes()
+    await asyncio.gather(*(work_loop() for _ in range(concurrency)))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_worker_process(concurrency, port=0):
+    if port:
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    asyncio.run(work(concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the deck ingestion worker pool")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "2")))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("INGEST_WORKER_CONCURRENCY", "4")),
+                        help="jobs each worker process runs at once")
+    args = parser.parse_args()
+
+    # Spawn rather than fork so every process opens its own Mongo and OpenAI connections
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker_process, args=(args.concurrency, metrics_port + i if metrics_port else 0))
+                 for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()